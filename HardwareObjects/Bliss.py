@@ -2,7 +2,6 @@
 Emits new_plot, plot_data and plot_end.
 """
 
-import itertools
 import gevent
 import numpy
 from HardwareRepository.BaseHardwareObjects import HardwareObject
@@ -12,11 +11,14 @@ from bliss.data.node import DataNodeIterator, _get_or_create_node
 __copyright__ = """ Copyright © 2019 by the MXCuBE collaboration """
 __license__ = "LGPLv3+"
 
+_SENTINEL = object()
+
 
 def all_equal(iterable):
     """ Check for same number of points on each line"""
-    grp = itertools.groupby(iterable)
-    return next(grp, True) and not next(grp, False)
+    itr = iter(iterable)
+    first = next(itr, _SENTINEL)
+    return first is _SENTINEL or all(item == first for item in itr)
 
 
 def watch_data(scan_node, scan_new_callback, scan_data_callback, scan_end_callback):
@@ -109,7 +111,15 @@ class Bliss(HardwareObject):
             scan_info(dict): Contains SCAN_INFO dictionary from bliss
         """
         scan_id = scan_info["scan_nb"]
-        self.__scan_data[scan_id] = list()
+        labels = tuple(scan_info["labels"])
+        # preallocate the data buffer, grown in __on_scan_data if needed
+        self.__scan_data[scan_id] = {
+            "labels": labels,
+            "buffer": numpy.empty(
+                (scan_info.get("npoints") or 1, len(labels)), dtype=numpy.float64
+            ),
+            "npoints": 0,
+        }
 
         if not scan_info["save"]:
             scan_info["root_path"] = "<no file>"
@@ -131,15 +141,22 @@ class Bliss(HardwareObject):
         """
 
         scan_id = scan_info["scan_nb"]
-        new_data = numpy.column_stack([data[name] for name in scan_info["labels"]])
-        self.__scan_data[scan_id].append(new_data)
-        self.emit(
-            "plot_data",
-            {
-                "id": scan_id,
-                "data": numpy.concatenate(self.__scan_data[scan_id]).tolist(),
-            },
-        )
+        scan_data = self.__scan_data[scan_id]
+        labels = scan_data["labels"]
+        start = scan_data["npoints"]
+        end = start + len(data[labels[0]])
+
+        buf = scan_data["buffer"]
+        if end > len(buf):
+            buf = numpy.empty((max(end, 2 * len(buf)), len(labels)), dtype=buf.dtype)
+            buf[:start] = scan_data["buffer"][:start]
+            scan_data["buffer"] = buf
+
+        for col, name in enumerate(labels):
+            buf[start:end, col] = data[name]
+        scan_data["npoints"] = end
+
+        self.emit("plot_data", {"id": scan_id, "data": buf[:end].tolist()})
 
     def __on_scan_end(self, scan_info):
         """Retrieve remaining data at the end of the scan. Emit plot_end.
@@ -147,11 +164,11 @@ class Bliss(HardwareObject):
             scan_info (int): ID of the scan
         """
         scan_id = scan_info["scan_nb"]
+        scan_data = self.__scan_data.pop(scan_id)
         self.emit(
             "plot_end",
             {
                 "id": scan_id,
-                "data": numpy.concatenate(self.__scan_data[scan_id]).tolist(),
+                "data": scan_data["buffer"][: scan_data["npoints"]].tolist(),
             },
         )
-        del self.__scan_data[scan_id]
@@ -67,8 +67,9 @@ class EDNACharacterisation(AbstractCharacterisation):
 
     def _run_edna(self, input_file, results_file, process_directory):
         """Starts EDNA"""
-        msg = "Starting EDNA characterisation using xml file %s" % input_file
-        logging.getLogger("queue_exec").info(msg)
+        logging.getLogger("queue_exec").info(
+            "Starting EDNA characterisation using xml file %s", input_file
+        )
 
         args = (self.start_edna_command, input_file, results_file, process_directory)
         subprocess.call("%s %s %s %s" % args, shell=True)
@@ -308,8 +309,12 @@ class EDNACharacterisation(AbstractCharacterisation):
             except AttributeError:
                 screening_id = None
 
-            for i in range(0, len(wedges)):
-                wedge = wedges[i]
+            # Values shared by all wedges are resolved once
+            ref_acq = reference_image_collection.acquisitions[0]
+            centred_position = ref_acq.acquisition_parameters.centred_position
+            ref_pt = ref_acq.path_template
+
+            for i, wedge in enumerate(wedges):
                 exp_condition = wedge.getExperimentalCondition()
                 goniostat = exp_condition.getGoniostat()
                 beam = exp_condition.getBeam()
@@ -319,17 +324,11 @@ class EDNACharacterisation(AbstractCharacterisation):
                     HWR.beamline.get_default_acquisition_parameters()
                 )
                 acquisition_parameters = acq.acquisition_parameters
-
-                acquisition_parameters.centred_position = reference_image_collection.acquisitions[
-                    0
-                ].acquisition_parameters.centred_position
-
-                acq.path_template = HWR.beamline.get_default_path_template()
+                acquisition_parameters.centred_position = centred_position
 
                 # Use the same path template as the reference_collection
                 # and update the members the needs to be changed. Keeping
                 # the directories of the reference collection.
-                ref_pt = reference_image_collection.acquisitions[0].path_template
                 acq.path_template = copy.deepcopy(ref_pt)
                 acq.path_template.wedge_prefix = "w" + str(i + 1)
                 acq.path_template.reference_image_prefix = str()
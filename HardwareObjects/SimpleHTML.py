@@ -267,3 +267,14 @@ def generate_parallel_processing_report(mesh_scan_results, params_dict):
     image = {"title": "plot", "filename": params_dict["cartography_path"]}
     json_dict["items"].append(create_json_images([image]))
     open(params_dict["json_file_path"], "w").write(json.dumps(json_dict, indent=4))
+
+
+def generate_empty_parallel_processing_report(params_dict, message):
+    html_file = open(params_dict["html_file_path"], "w")
+    html_file.write(HTML_START % message)
+    html_file.write(create_text(message, heading=1))
+    html_file.write(HTML_END)
+    html_file.close()
+
+    json_dict = {"items": [{"type": "title", "value": message}]}
+    open(params_dict["json_file_path"], "w").write(json.dumps(json_dict, indent=4))
@@ -306,6 +306,10 @@ class AbstractCollect(HardwareObject, object):
         Descript. :
         """
         for directory in args:
+            # os.makedirs(exist_ok=True) is not available in Python 2.7,
+            # check first so the common existing case raises nothing
+            if os.path.isdir(directory):
+                continue
             try:
                 os.makedirs(directory)
             except os.error as e:
@@ -20,16 +20,19 @@ import os
 import time
 import logging
 import json
-import subprocess
 import numpy as np
 
 from copy import copy
 from scipy import ndimage
 from scipy.interpolate import UnivariateSpline
-import matplotlib.pyplot as plt
-from mpl_toolkits.axes_grid1 import make_axes_locatable
+from PIL import Image
+from matplotlib import cm
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 import gevent
+import gevent.subprocess
 
 import SimpleHTML
 from HardwareRepository.BaseHardwareObjects import HardwareObject
@@ -86,6 +89,10 @@ class AbstractOnlineProcessing(HardwareObject):
 
         self.plot_points_num = None
         self.current_grid_index = None
+        self.grid_cols = None
+        self.grid_rows = None
+        self.grid_indices = None
+        self.grid_valid = None
         self.grid_properties = []
 
     def init(self):
@@ -207,12 +214,27 @@ class AbstractOnlineProcessing(HardwareObject):
         self.params_dict["csv_file_path"] = os.path.join(
             archive_directory, "parallel_processing.csv"
         )
+        self.params_dict["score_csv_file_path"] = os.path.join(
+            archive_directory, "parallel_processing_score.csv"
+        )
+        self.params_dict["grid_overlay_file_path"] = os.path.join(
+            archive_directory, "grid_overlay.png"
+        )
+        self.params_dict["snapshot_file_path"] = os.path.join(
+            archive_directory, "snapshot.png"
+        )
 
         self.params_dict["template"] = template
         self.params_dict["first_image_num"] = first_image_num
         self.params_dict["images_num"] = images_num
         self.params_dict["lines_num"] = lines_num
-        self.params_dict["images_per_line"] = images_num / lines_num
+        self.params_dict["images_per_line"] = images_num // lines_num
+        if images_num % lines_num:
+            logging.getLogger("HWR").warning(
+                "Parallel processing: %d images do not divide into %d lines",
+                images_num,
+                lines_num,
+            )
         self.params_dict["run_number"] = run_number
         self.params_dict["osc_midle"] = acq_params.osc_start
         self.params_dict["osc_range"] = acq_params.osc_range
@@ -236,7 +258,7 @@ class AbstractOnlineProcessing(HardwareObject):
         )
         self.params_dict["comments"] = "Scan lines: %d, frames per line: %d" % (
             lines_num,
-            images_num / lines_num,
+            self.params_dict["images_per_line"],
         )
         self.params_dict["workflow_type"] = self.data_collection.run_processing_parallel
 
@@ -256,31 +278,69 @@ class AbstractOnlineProcessing(HardwareObject):
             self.params_dict["steps_y"] = 1
             self.params_dict["reversing_rotation"] = False
 
+        # Grid (col, row) of each image is resolved once and reused
+        # every time the results are aligned
+        if self.grid:
+            self.grid_cols, self.grid_rows = (
+                np.array(
+                    [
+                        self.grid.get_col_row_from_image_serial(
+                            index + first_image_num
+                        )
+                        for index in range(images_num)
+                    ],
+                    dtype=int,
+                )
+                .reshape(-1, 2)
+                .T
+            )
+            # Flat index of each image in the (steps_x, steps_y) aligned
+            # arrays. Images outside of the grid are masked out
+            grid_shape = (self.params_dict["steps_x"], self.params_dict["steps_y"])
+            self.grid_valid = (self.grid_cols < grid_shape[0]) & (
+                self.grid_rows < grid_shape[1]
+            )
+            self.grid_indices = np.ravel_multi_index(
+                (self.grid_cols, self.grid_rows), grid_shape, mode="clip"
+            )
+        else:
+            self.grid_cols = self.grid_rows = None
+            self.grid_indices = self.grid_valid = None
+
         self.results_raw = {}
         self.results_aligned = {}
 
         # Empty numpy arrays to store raw and aligned results
         self.plot_points_num = images_num
 
+        # Results with the default size are rows of one contiguous block
+        block_keys = [
+            result_type["key"]
+            for result_type in self.result_types
+            if "size" not in result_type
+        ]
+        raw_block = np.zeros((len(block_keys), images_num), dtype=np.float32)
+        aligned_block = np.zeros((len(block_keys), images_num), dtype=np.float32)
+
         for result_type in self.result_types:
-            # images_num =  self.params_dict["images_num"]
-            if "size" in result_type:
-                images_num = result_type["size"]
+            key = result_type["key"]
+            if key in block_keys:
+                size = images_num
+                self.results_raw[key] = raw_block[block_keys.index(key)]
+                self.results_aligned[key] = aligned_block[block_keys.index(key)]
             else:
-                images_num = self.params_dict["images_num"]
-
-            self.results_raw[result_type["key"]] = np.zeros(images_num)
-            self.results_aligned[result_type["key"]] = np.zeros(images_num)
+                size = result_type["size"]
+                self.results_raw[key] = np.zeros(size, dtype=np.float32)
+                self.results_aligned[key] = np.zeros(size, dtype=np.float32)
 
             if self.interpolate_results:
-                self.results_aligned["interp_" + result_type] = np.zeros(images_num)
-            if (
-                self.data_collection.is_mesh()
-                and images_num == self.params_dict["images_num"]
-            ):
-                self.results_aligned[result_type["key"]] = self.results_aligned[
-                    result_type["key"]
-                ].reshape(self.params_dict["steps_x"], self.params_dict["steps_y"])
+                self.results_aligned["interp_" + key] = np.zeros(
+                    size, dtype=np.float32
+                )
+            if self.data_collection.is_mesh() and size == images_num:
+                self.results_aligned[key] = self.results_aligned[key].reshape(
+                    self.params_dict["steps_x"], self.params_dict["steps_y"]
+                )
 
         # if not self.data_collection.is_mesh():
         #    self.results_raw["x_array"] = np.linspace(
@@ -289,12 +349,12 @@ class AbstractOnlineProcessing(HardwareObject):
 
         try:
             gevent.spawn(
-                self.save_snapshot_task, os.path.join(archive_directory, "snapshot.png")
+                self.save_snapshot_task, self.params_dict["snapshot_file_path"]
             )
         except Exception:
             logging.getLogger("GUI").exception(
                 "Parallel processing: Could not save snapshot: %s"
-                % os.path.join(archive_directory, "snapshot.png")
+                % self.params_dict["snapshot_file_path"]
             )
 
         self.emit(
@@ -338,18 +398,13 @@ class AbstractOnlineProcessing(HardwareObject):
             logging.getLogger("queue_exec").error(msg)
             self.set_processing_status("Failed")
         else:
-            line_to_execute = (
-                self.start_command
-                + " "
-                + input_filename
-                + " "
-                + self.params_dict["process_directory"]
-            )
-
             self.started = True
-            subprocess.Popen(
-                str(line_to_execute),
-                shell=True,
+            gevent.subprocess.Popen(
+                [
+                    self.start_command,
+                    input_filename,
+                    self.params_dict["process_directory"],
+                ],
                 stdin=None,
                 stdout=None,
                 stderr=None,
@@ -443,60 +498,54 @@ class AbstractOnlineProcessing(HardwareObject):
 
         self.started = False
         self.params_dict["status"] = status
+        self.params_dict["max_dozor_score"] = float(
+            self.results_aligned["score"].max()
+        )
+
+        # ---------------------------------------------------------------------
+        # done_event is already set, so the next scan may be prepared while
+        # this greenlet waits. Everything below reads these snapshots only
+        params_dict = dict(self.params_dict)
+        results_raw = dict(self.results_raw)
+        results_aligned = dict(self.results_aligned)
+        grid = self.grid
 
         # ---------------------------------------------------------------------
         # Assembling all file names
-        self.params_dict["max_dozor_score"] = self.results_aligned["score"].max()
-        best_positions = self.results_aligned.get("best_positions", [])
+        best_positions = results_aligned.get("best_positions", [])
 
-        processing_grid_overlay_file = os.path.join(
-            self.params_dict["archive_directory"], "grid_overlay.png"
-        )
-        # processing_plot_archive_file = os.path.join(
-        #    self.params_dict["archive_directory"], "parallel_processing_plot.png"
-        # )
-        processing_csv_archive_file = os.path.join(
-            self.params_dict["archive_directory"], "parallel_processing_score.csv"
-        )
+        processing_grid_overlay_file = params_dict["grid_overlay_file_path"]
+        processing_csv_archive_file = params_dict["score_csv_file_path"]
 
         # If MeshScan and XrayCentring then info is stored in ISPyB
-        if self.params_dict["workflow_type"] in (
-            "MeshScan",
-            "XrayCentering",
-            "LineScan",
-        ):
+        if params_dict["workflow_type"] in ("MeshScan", "XrayCentering", "LineScan"):
             if self.workflow_info is not None:
-                self.params_dict["workflow_id"] = self.workflow_info["workflow_id"]
+                params_dict["workflow_id"] = self.workflow_info["workflow_id"]
 
             (
                 workflow_id,
                 workflow_mesh_id,
                 grid_info_id,
-            ) = HWR.beamline.lims.store_workflow(self.params_dict)
+            ) = HWR.beamline.lims.store_workflow(params_dict)
 
-            self.params_dict["workflow_id"] = workflow_id
-            self.params_dict["workflow_mesh_id"] = workflow_mesh_id
-            self.params_dict["grid_info_id"] = grid_info_id
+            params_dict["workflow_id"] = workflow_id
+            params_dict["workflow_mesh_id"] = workflow_mesh_id
+            params_dict["grid_info_id"] = grid_info_id
 
-            if self.params_dict["workflow_type"] == "XrayCentering" and self.grid:
+            if params_dict["workflow_type"] == "XrayCentering" and grid:
                 self.workflow_info = {
-                    "workflow_id": self.params_dict["workflow_id"],
-                    "process_root_directory": self.params_dict[
-                        "process_root_directory"
-                    ],
-                    "archive_root_directory": self.params_dict[
-                        "archive_root_directory"
-                    ],
+                    "workflow_id": params_dict["workflow_id"],
+                    "process_root_directory": params_dict["process_root_directory"],
+                    "archive_root_directory": params_dict["archive_root_directory"],
                 }
             else:
                 self.workflow_info = None
 
             HWR.beamline.collect.update_lims_with_workflow(
-                workflow_id,
-                os.path.join(self.params_dict["archive_directory"], "snapshot.png"),
+                workflow_id, params_dict["snapshot_file_path"]
             )
 
-            HWR.beamline.lims.store_workflow_step(self.params_dict)
+            HWR.beamline.lims.store_workflow_step(params_dict)
             if len(best_positions) > 0:
                 HWR.beamline.collect.store_image_in_lims_by_frame_num(
                     best_positions[0]["index"]
@@ -505,45 +554,28 @@ class AbstractOnlineProcessing(HardwareObject):
 
         HWR.beamline.lims.set_image_quality_indicators_plot(
             HWR.beamline.collect.collection_id,
-            self.params_dict["cartography_path"],
-            self.params_dict["csv_file_path"],
+            params_dict["cartography_path"],
+            params_dict["csv_file_path"],
         )
 
-        fig, ax = plt.subplots(nrows=1, ncols=1)
-        if self.grid:
-            current_max = max(fig.get_size_inches())
-            grid_width = self.params_dict["steps_x"] * self.params_dict["xOffset"]
-            grid_height = self.params_dict["steps_y"] * self.params_dict["yOffset"]
-
-            if grid_width > grid_height:
-                fig.set_size_inches(current_max, current_max * grid_height / grid_width)
-            else:
-                fig.set_size_inches(current_max * grid_width / grid_height, current_max)
-
-            im = ax.imshow(
-                np.transpose(self.results_aligned["score"]),
-                interpolation="none",
-                aspect="auto",
-                extent=[
-                    0,
-                    self.results_aligned["score"].shape[0],
-                    0,
-                    self.results_aligned["score"].shape[1],
-                ],
-            )
-            im.set_cmap("hot")
+        # ---------------------------------------------------------------------
+        # Score is stored as (col, row), images are drawn as (row, col).
+        # The overlay and the plot share one transposed view
+        score_image = None
+        if grid:
+            score_image = results_aligned["score"].T
 
+        # ---------------------------------------------------------------------
+        # Stores grid overlay
+        if grid:
             try:
                 if not os.path.exists(os.path.dirname(processing_grid_overlay_file)):
                     os.makedirs(os.path.dirname(processing_grid_overlay_file))
 
-                plt.imsave(
-                    processing_grid_overlay_file,
-                    np.transpose(self.results_aligned["score"]),
-                    format="png",
-                    cmap="hot",
-                )
-                self.grid.set_overlay_pixmap(processing_grid_overlay_file)
+                # Colour mapped score written directly as png
+                overlay = cm.hot(Normalize()(score_image), bytes=True)
+                Image.fromarray(overlay).save(processing_grid_overlay_file, "PNG")
+                grid.set_overlay_pixmap(processing_grid_overlay_file)
                 log.info(
                     "Parallel processing: Grid overlay figure saved %s"
                     % processing_grid_overlay_file
@@ -554,149 +586,60 @@ class AbstractOnlineProcessing(HardwareObject):
                     % processing_grid_overlay_file
                 )
 
-            if len(best_positions) > 0:
-                plt.axvline(x=best_positions[0]["col"], linewidth=0.5)
-                plt.axhline(y=best_positions[0]["row"], linewidth=0.5)
-
-                divider = make_axes_locatable(ax)
-                cax = divider.append_axes("right", size=0.1, pad=0.05)
-                cax.tick_params(axis="x", labelsize=8)
-                cax.tick_params(axis="y", labelsize=8)
-                plt.colorbar(im, cax=cax)
-        else:
-            # max_resolution = self.params_dict["resolution"]
-            # min_resolution = self.results_aligned["spots_resolution"].max()
-
-            # TODO plot results based on the result_name_list
-            max_score = self.results_aligned["score"].max()
-            if max_score == 0:
-                max_score = 1
-            max_spots_num = self.results_aligned["spots_num"].max()
-            if max_spots_num == 0:
-                max_spots_num = 1
-
-            plt.plot(
-                self.results_aligned["score"] / max_score, ".", label="Score", c="r"
-            )
-            plt.plot(
-                self.results_aligned["spots_num"] / max_spots_num,
-                ".",
-                label="Number of spots",
-                c="b",
-            )
-            plt.plot(
-                self.results_aligned["spots_resolution"], ".", label="Resolution", c="y"
-            )
-
-            ax.legend(
-                loc="lower center",
-                fancybox=True,
-                numpoints=1,
-                borderaxespad=0.0,
-                bbox_to_anchor=(0.5, -0.13),
-                ncol=3,
-                fontsize=8,
-            )
-            ax.set_ylim(-0.01, 1.1)
-            ax.set_xlim(0, self.params_dict["images_num"])
-
-            positions = np.linspace(
-                0, self.results_aligned["spots_resolution"].max(), 5
-            )
-            labels = ["inf"]
-            for item in positions[1:]:
-                labels.append("%.2f" % (1.0 / item))
-            ax.set_yticks(positions)
-            ax.set_yticklabels(labels)
-
-            # new_labels = numpy.linspace(min_resolution, max_resolution / 1.2, len(ax.get_yticklabels()))
-            # new_labels = numpy.round(new_labels, 1)
-            # ax.set_yticklabels(new_labels)
-            ax.set_ylabel("Resolution")
-
-            ay1 = ax.twinx()
-            new_labels = np.linspace(
-                0,
-                self.results_aligned["spots_num"].max(),
-                len(ay1.get_yticklabels()),
-                dtype=np.int16,
-            )
-            ay1.set_yticklabels(new_labels)
-            ay1.set_ylabel("Number of spots")
-
         # ---------------------------------------------------------------------
-        ax.tick_params(axis="x", labelsize=8)
-        ax.tick_params(axis="y", labelsize=8)
-        ax.set_title(self.params_dict["title"], fontsize=8)
-
-        ax.grid(True)
-        ax.spines["left"].set_position(("outward", 10))
-        ax.spines["bottom"].set_position(("outward", 10))
-
-        # ---------------------------------------------------------------------
-        # Stores plot in the processing directory
-        try:
-            if not os.path.exists(
-                os.path.dirname(self.params_dict["cartography_path"])
-            ):
-                os.makedirs(os.path.dirname(self.params_dict["cartography_path"]))
-            fig.savefig(
-                self.params_dict["cartography_path"], dpi=100, bbox_inches="tight"
-            )
+        # Plot is rendered in a native thread to keep the gevent hub running.
+        # Logging stays in the greenlet
+        error = gevent.get_hub().threadpool.apply(
+            self.save_processing_plot,
+            (
+                params_dict,
+                results_aligned["score"],
+                results_aligned["spots_num"],
+                results_aligned["spots_resolution"],
+                best_positions,
+                score_image,
+            ),
+        )
+        if error is None:
             log.info(
                 "Parallel processing: Plot saved in %s"
-                % self.params_dict["cartography_path"]
-            )
-        except Exception:
-            log.exception(
-                "Parallel processing: Could not save plot in %s"
-                % self.params_dict["cartography_path"]
+                % params_dict["cartography_path"]
             )
-
-        # ---------------------------------------------------------------------
-        # Stores plot for ISPyB
-        try:
-            if not os.path.exists(
-                os.path.dirname(self.params_dict["cartography_path"])
-            ):
-                os.makedirs(os.path.dirname(self.params_dict["cartography_path"]))
-            fig.savefig(
-                self.params_dict["cartography_path"], dpi=100, bbox_inches="tight"
-            )
-            log.info(
-                "Parallel processing: Plot for ISPyB saved in %s"
-                % self.params_dict["cartography_path"]
-            )
-        except Exception:
-            log.exception(
-                "Parallel processing: Could not save plot for ISPyB %s"
-                % self.params_dict["cartography_path"]
+        else:
+            log.error(
+                "Parallel processing: Could not save plot in %s (%s)"
+                % (params_dict["cartography_path"], error)
             )
 
-        plt.close(fig)
-
         # ---------------------------------------------------------------------
         # Generates html and json files
         try:
-            SimpleHTML.generate_parallel_processing_report(
-                self.results_aligned, self.params_dict
-            )
+            if params_dict["max_dozor_score"] > 0:
+                SimpleHTML.generate_parallel_processing_report(
+                    results_aligned, params_dict
+                )
+            else:
+                # Nothing to tabulate, only a short page is written
+                SimpleHTML.generate_empty_parallel_processing_report(
+                    params_dict, "No diffraction found"
+                )
+                log.info("Parallel processing: No diffraction, full report skipped")
             log.info(
                 "Parallel processing: Html report saved in %s"
-                % self.params_dict["html_file_path"]
+                % params_dict["html_file_path"]
             )
             log.info(
                 "Parallel processing: Json report saved in %s"
-                % self.params_dict["json_file_path"]
+                % params_dict["json_file_path"]
             )
         except Exception:
             log.exception(
                 "Parallel processing: Could not save results html %s"
-                % self.params_dict["html_file_path"]
+                % params_dict["html_file_path"]
             )
             log.exception(
                 "Parallel processing: Could not save json results in %s"
-                % self.params_dict["json_file_path"]
+                % params_dict["json_file_path"]
             )
 
         # ---------------------------------------------------------------------
@@ -706,13 +649,13 @@ class AbstractOnlineProcessing(HardwareObject):
             processing_csv_file.write(
                 "%s,%d,%d,%d,%d,%d,%s,%d,%d,%f,%f,%s\n"
                 % (
-                    self.params_dict["template"],
-                    self.params_dict["first_image_num"],
-                    self.params_dict["images_num"],
-                    self.params_dict["run_number"],
-                    self.params_dict["run_number"],
-                    self.params_dict["lines_num"],
-                    str(self.params_dict["reversing_rotation"]),
+                    params_dict["template"],
+                    params_dict["first_image_num"],
+                    params_dict["images_num"],
+                    params_dict["run_number"],
+                    params_dict["run_number"],
+                    params_dict["lines_num"],
+                    str(params_dict["reversing_rotation"]),
                     HWR.beamline.detector.get_pixel_min(),
                     HWR.beamline.detector.get_pixel_max(),
                     self.beamstop_hwobj.get_size(),
@@ -720,14 +663,14 @@ class AbstractOnlineProcessing(HardwareObject):
                     self.beamstop_hwobj.get_direction(),
                 )
             )
-            for index in range(self.params_dict["images_num"]):
+            for index in range(params_dict["images_num"]):
                 processing_csv_file.write(
                     "%d,%f,%d,%f\n"
                     % (
                         index,
-                        self.results_raw["score"][index],
-                        self.results_raw["spots_num"][index],
-                        self.results_raw["spots_resolution"][index],
+                        results_raw["score"][index],
+                        results_raw["spots_num"][index],
+                        results_raw["spots_resolution"][index],
                     )
                 )
             log.info(
@@ -742,33 +685,163 @@ class AbstractOnlineProcessing(HardwareObject):
             )
         # ---------------------------------------------------------------------
 
+    def save_processing_plot(
+        self,
+        params_dict,
+        score,
+        spots_num,
+        spots_resolution,
+        best_positions,
+        score_image=None,
+    ):
+        """Renders the processing results plot and stores it in the archive
+           directory. The same file is used by ISPyB.
+           Runs in a native thread: it only reads its arguments and does not
+           log, errors are returned to the calling greenlet
+
+        :param params_dict: snapshot of the processing parameters
+        :type params_dict: dict
+        :param score: aligned score
+        :type score: numpy.ndarray
+        :param spots_num: aligned number of spots
+        :type spots_num: numpy.ndarray
+        :param spots_resolution: aligned spots resolution
+        :type spots_resolution: numpy.ndarray
+        :param best_positions: best positions extracted from the results
+        :type best_positions: list
+        :param score_image: score map in (row, col) order, given for grids
+        :type score_image: numpy.ndarray
+        :returns: None on success, otherwise the raised exception
+        """
+        # Object oriented Agg figure, not registered in the pyplot state
+        fig = Figure()
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        if score_image is not None:
+            current_max = max(fig.get_size_inches())
+            grid_width = params_dict["steps_x"] * params_dict["xOffset"]
+            grid_height = params_dict["steps_y"] * params_dict["yOffset"]
+
+            if grid_width > grid_height:
+                fig.set_size_inches(current_max, current_max * grid_height / grid_width)
+            else:
+                fig.set_size_inches(current_max * grid_width / grid_height, current_max)
+
+            im = ax.imshow(
+                score_image,
+                interpolation="none",
+                aspect="auto",
+                extent=[0, score.shape[0], 0, score.shape[1]],
+            )
+            im.set_cmap("hot")
+
+            if len(best_positions) > 0:
+                ax.axvline(x=best_positions[0]["col"], linewidth=0.5)
+                ax.axhline(y=best_positions[0]["row"], linewidth=0.5)
+
+                # Colorbar carries no information for a constant score map
+                if np.ptp(score) > 0:
+                    colorbar = fig.colorbar(im, ax=ax, fraction=0.05, pad=0.05)
+                    colorbar.ax.tick_params(labelsize=8)
+        else:
+            # max_resolution = params_dict["resolution"]
+            # min_resolution = spots_resolution.max()
+
+            # TODO plot results based on the result_name_list
+            # Each maximum is computed once and reused for scaling and ticks
+            max_score = params_dict["max_dozor_score"] or 1
+            max_spots_num = spots_num.max()
+            max_resolution = spots_resolution.max()
+
+            ax.plot(score / max_score, ".", label="Score", c="r")
+            ax.plot(
+                spots_num / (max_spots_num or 1), ".", label="Number of spots", c="b"
+            )
+            ax.plot(spots_resolution, ".", label="Resolution", c="y")
+
+            ax.legend(
+                loc="lower center",
+                fancybox=True,
+                numpoints=1,
+                borderaxespad=0.0,
+                bbox_to_anchor=(0.5, -0.13),
+                ncol=3,
+                fontsize=8,
+            )
+            ax.set_ylim(-0.01, 1.1)
+            ax.set_xlim(0, params_dict["images_num"])
+
+            positions = np.linspace(0, max_resolution, 5)
+            labels = ["inf"]
+            for item in positions[1:]:
+                labels.append("%.2f" % (1.0 / item))
+            ax.set_yticks(positions)
+            ax.set_yticklabels(labels)
+
+            # new_labels = numpy.linspace(min_resolution, max_resolution / 1.2, len(ax.get_yticklabels()))
+            # new_labels = numpy.round(new_labels, 1)
+            # ax.set_yticklabels(new_labels)
+            ax.set_ylabel("Resolution")
+
+            ay1 = ax.twinx()
+            new_labels = np.linspace(
+                0, max_spots_num, len(ay1.get_yticklabels()), dtype=np.int16
+            )
+            ay1.set_yticklabels(new_labels)
+            ay1.set_ylabel("Number of spots")
+
+        # ---------------------------------------------------------------------
+        ax.tick_params(axis="x", labelsize=8)
+        ax.tick_params(axis="y", labelsize=8)
+        ax.set_title(params_dict["title"], fontsize=8)
+
+        ax.grid(True)
+        ax.spines["left"].set_position(("outward", 10))
+        ax.spines["bottom"].set_position(("outward", 10))
+
+        # ---------------------------------------------------------------------
+        # Stores plot in the archive directory
+        try:
+            if not os.path.exists(os.path.dirname(params_dict["cartography_path"])):
+                os.makedirs(os.path.dirname(params_dict["cartography_path"]))
+            canvas.print_figure(
+                params_dict["cartography_path"], dpi=100, bbox_inches="tight"
+            )
+        except Exception as ex:
+            return ex
+
     def align_processing_results(self, start_index, end_index):
         """Realigns all results. Each results (one dimensional numpy array)
            is converted to 2d numpy array according to diffractometer geometry.
            Function also extracts 10 (if they exist) best positions
         """
         # Each result array is realigned
+        if self.grid:
+            # All aligned mesh arrays share the grid shape, so the flat
+            # target indices are selected once for every result
+            valid = self.grid_valid[start_index : end_index + 1]
+            indices = self.grid_indices[start_index : end_index + 1][valid]
 
         for score_key in self.results_raw.keys():
             if (
                 self.grid
                 and self.results_raw[score_key].size == self.params_dict["images_num"]
             ):
-                for cell_index in range(start_index, end_index + 1):
-                    col, row = self.grid.get_col_row_from_image_serial(
-                        cell_index + self.params_dict["first_image_num"]
-                    )
-                    if (
-                        col < self.results_aligned[score_key].shape[0]
-                        and row < self.results_aligned[score_key].shape[1]
-                    ):
-                        self.results_aligned[score_key][col][row] = self.results_raw[
-                            score_key
-                        ][cell_index]
+                self.results_aligned[score_key].flat[indices] = self.results_raw[
+                    score_key
+                ][start_index : end_index + 1][valid]
             else:
-                self.results_aligned[score_key] = self.results_raw[score_key][
-                    :: self.params_dict["images_num"] / self.plot_points_num
-                ]
+                # Average each block of step images into one plot point
+                step = self.params_dict["images_num"] // self.plot_points_num
+                if step > 1:
+                    points_num = self.results_raw[score_key].size // step
+                    self.results_aligned[score_key] = (
+                        self.results_raw[score_key][: points_num * step]
+                        .reshape(points_num, step)
+                        .mean(axis=1)
+                    )
+                else:
+                    self.results_aligned[score_key] = self.results_raw[score_key][:]
                 if self.interpolate_results:
                     x_array = np.linspace(
                         0,
@@ -809,8 +882,12 @@ class AbstractOnlineProcessing(HardwareObject):
         # Best positions are extracted
         best_positions_list = []
 
-        index_arr = (-self.results_raw["score"]).argsort()[:10]
-        if len(index_arr) > 0:
+        # Only the 10 best scores are selected and sorted
+        neg_score = -self.results_raw["score"]
+        best_num = min(10, neg_score.size)
+        if best_num > 0:
+            index_arr = np.argpartition(neg_score, best_num - 1)[:best_num]
+            index_arr = index_arr[neg_score[index_arr].argsort()]
             for index in index_arr:
                 if self.results_raw["score"][index] > 0:
                     best_position = {}
@@ -818,11 +895,13 @@ class AbstractOnlineProcessing(HardwareObject):
                     best_position["index_serial"] = (
                         self.params_dict["first_image_num"] + index
                     )
-                    best_position["score"] = self.results_raw["score"][index]
-                    best_position["spots_num"] = self.results_raw["spots_num"][index]
-                    best_position["spots_resolution"] = self.results_raw[
-                        "spots_resolution"
-                    ][index]
+                    best_position["score"] = float(self.results_raw["score"][index])
+                    best_position["spots_num"] = int(
+                        self.results_raw["spots_num"][index]
+                    )
+                    best_position["spots_resolution"] = float(
+                        self.results_raw["spots_resolution"][index]
+                    )
                     best_position["filename"] = os.path.basename(
                         self.params_dict["template"]
                         % (
@@ -833,11 +912,12 @@ class AbstractOnlineProcessing(HardwareObject):
 
                     cpos = None
                     if self.grid:
-                        col, row = self.grid.get_col_row_from_image_serial(
-                            index + self.params_dict["first_image_num"]
+                        col = int(self.grid_cols[index]) + 0.5
+                        row = (
+                            self.params_dict["steps_y"]
+                            - int(self.grid_rows[index])
+                            - 0.5
                         )
-                        col += 0.5
-                        row = self.params_dict["steps_y"] - row - 0.5
                         cpos = self.grid.get_motor_pos_from_col_row(col, row)
                     else:
                         col = index
@@ -969,17 +969,14 @@ class CharacterisationQueueEntry(BaseQueueEntry):
 
     def execute(self):
         BaseQueueEntry.execute(self)
+        log = logging.getLogger("user_level_log")
 
         if HWR.beamline.characterisation is not None:
             if self.get_data_model().wait_result:
-                logging.getLogger("user_level_log").warning(
-                    "Characterisation: Please wait ..."
-                )
+                log.warning("Characterisation: Please wait ...")
                 self.start_char()
             else:
-                logging.getLogger("user_level_log").info(
-                    "Characterisation: Started in the background"
-                )
+                log.info("Characterisation: Started in the background")
                 gevent.spawn(self.start_char)
 
     def start_char(self):